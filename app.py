@@ -1,6 +1,8 @@
-import json
-import textwrap
+import base64
+import re
+from collections import deque
 from datetime import datetime
+from itertools import islice
 from typing import Dict, Tuple
 
 import streamlit as st
@@ -18,21 +20,25 @@ st.set_page_config(
 
 # ---------- Session state initialization ----------
 def init_session_state() -> None:
+    if "_inited" in st.session_state:
+        return
     defaults = {
         "from_lang": "Python",
         "to_lang": "JavaScript",
         "prompt": "",
         "input_code": "",
         "output_code": "",
-        "history": [],  # List[Dict]
+        "output_bytes": b"",  # UTF-8 of output_code, for the download button
+        "output_lang": "JavaScript",  # target language of output_code
+        "history": deque(maxlen=10),  # Deque[Dict], newest first
         "history_limit": 10,
         "ai_open": False,
         "ai_messages": [],
         "theme": "Light",  # Light | Dark | Auto
     }
     for key, value in defaults.items():
-        if key not in st.session_state:
-            st.session_state[key] = value
+        st.session_state.setdefault(key, value)
+    st.session_state._inited = True
 
 
 init_session_state()
@@ -40,35 +46,65 @@ init_session_state()
 
 # ---------- Constants & helpers ----------
 LANGUAGES = ["Python", "Java", "C++", "JavaScript"]
+_LANG_INDEX: Dict[str, int] = {lang: i for i, lang in enumerate(LANGUAGES)}
+
+_LANG_EXT_HIGHLIGHT: Dict[str, Tuple[str, str, str]] = {
+    "Python": (".py", "python", "text/x-python"),
+    "Java": (".java", "java", "text/x-java-source"),
+    "C++": (".cpp", "cpp", "text/x-c++src"),
+    "JavaScript": (".js", "javascript", "application/javascript"),
+}
+
+_COMMENT_PREFIX: Dict[str, str] = {
+    "Python": "# ",
+    "Java": "// ",
+    "C++": "// ",
+    "JavaScript": "// ",
+}
 
 
 def language_to_ext_and_highlight(lang: str) -> Tuple[str, str, str]:
-    mapping: Dict[str, Tuple[str, str, str]] = {
-        "Python": (".py", "python", "text/x-python"),
-        "Java": (".java", "java", "text/x-java-source"),
-        "C++": (".cpp", "cpp", "text/x-c++src"),
-        "JavaScript": (".js", "javascript", "application/javascript"),
-    }
-    return mapping.get(lang, (".txt", "text", "text/plain"))
+    return _LANG_EXT_HIGHLIGHT.get(lang, (".txt", "text", "text/plain"))
 
 
+@st.cache_data(max_entries=64, show_spinner=False)
 def convert_code_placeholder(from_lang: str, to_lang: str, prompt: str, code: str) -> str:
-    banner = f"// Conversion from {from_lang} to {to_lang} completed!\n"
-    comment_prefix = {
-        "Python": "# ",
-        "Java": "// ",
-        "C++": "// ",
-        "JavaScript": "// ",
-    }.get(to_lang, "// ")
-    prompt_block = (
-        f"{comment_prefix}Prompt: {prompt.strip()}\n" if prompt.strip() else ""
-    )
-    note = (
-        f"{comment_prefix}This is a placeholder. Replace with real conversion output.\n\n"
-    )
-    original_header = f"{comment_prefix}Original {from_lang} code below for reference:\n"
-    original = textwrap.indent(code, prefix=comment_prefix)
-    return banner + prompt_block + note + original_header + original
+    comment_prefix = _COMMENT_PREFIX.get(to_lang, "// ")
+    parts = [f"// Conversion from {from_lang} to {to_lang} completed!\n"]
+    prompt = prompt.strip()
+    if prompt:
+        parts.append(f"{comment_prefix}Prompt: {prompt}\n")
+    parts.append(f"{comment_prefix}This is a placeholder. Replace with real conversion output.\n\n")
+    parts.append(f"{comment_prefix}Original {from_lang} code below for reference:\n")
+    lines = code.splitlines(keepends=True)
+    if lines:
+        parts.append(comment_prefix)
+        parts.append(comment_prefix.join(lines))
+    # One allocation for the result instead of a copy per "+"
+    return "".join(parts)
+
+
+def _preview(code: str, n: int = 120) -> str:
+    head = code[:n]
+    return head + "…" if len(code) > n else head
+
+
+_MD_SPECIAL = re.compile(r"([\\`*_{}\[\]()#+\-.!|<>$~])")
+_BACKTICK_RUN = re.compile(r"`+")
+
+
+def _md_escape(text: str) -> str:
+    # Backslash-escape markdown (and Streamlit's $ math) punctuation
+    return _MD_SPECIAL.sub(r"\\\1", text)
+
+
+def _md_code_span(text: str) -> str:
+    # Inline code on one line, fenced by one more backtick than the longest run
+    text = " ".join(text.splitlines())
+    fence = "`" * (max((len(run) for run in _BACKTICK_RUN.findall(text)), default=0) + 1)
+    if text.startswith("`") or text.endswith("`"):
+        text = f" {text} "
+    return f"{fence}{text}{fence}"
 
 
 def add_to_history(from_lang: str, to_lang: str, prompt: str, code: str) -> None:
@@ -77,14 +113,13 @@ def add_to_history(from_lang: str, to_lang: str, prompt: str, code: str) -> None
         "from": from_lang,
         "to": to_lang,
         "prompt": prompt.strip(),
-        "code_preview": (code[:120] + "…") if len(code) > 120 else code,
+        "code_preview": _preview(code),
     }
-    st.session_state.history.insert(0, entry)
-    # Trim history
-    st.session_state.history = st.session_state.history[: st.session_state.history_limit]
+    # The deque's maxlen trims the oldest entry
+    st.session_state.history.appendleft(entry)
 
 
-def inject_css(theme: str) -> None:
+def _build_critical_css(theme: str) -> str:
     is_dark = theme == "Dark"
     primary = "#2563eb"  # blue-600
     bg_light = "#f7f9fc"
@@ -99,8 +134,7 @@ def inject_css(theme: str) -> None:
     card = card_dark if is_dark else card_light
     text = text_dark if is_dark else text_light
 
-    st.markdown(
-        f"""
+    return f"""
         <style>
         :root {{
           --primary: {primary};
@@ -114,17 +148,31 @@ def inject_css(theme: str) -> None:
           color: var(--text);
         }}
 
+        /* Header title and caption render before the full block */
+        .cc-title {{
+          font-weight: 800; letter-spacing: -0.01em;
+        }}
+        .cc-caption {{
+          font-size: 0.875rem; opacity: 0.6; margin: 0;
+        }}
+        </style>
+        """
+
+
+# Everything below only references the theme variables, so it is theme-independent.
+_FULL_CSS = """
+        <style>
         /* Cards */
-        .cc-card {{
+        .cc-card {
           background: var(--card);
           border-radius: 14px;
           padding: 1rem 1.25rem;
           box-shadow: 0 8px 24px rgba(2, 6, 23, 0.08);
           border: 1px solid rgba(2, 6, 23, 0.06);
-        }}
+        }
 
         /* Buttons */
-        .stButton > button {{
+        .stButton > button {
           background: var(--primary);
           color: white;
           border: none;
@@ -133,33 +181,33 @@ def inject_css(theme: str) -> None:
           font-weight: 600;
           box-shadow: 0 6px 18px rgba(37, 99, 235, 0.35);
           transition: transform 0.06s ease, box-shadow 0.2s ease;
-        }}
-        .stButton > button:hover {{
+        }
+        .stButton > button:hover {
           transform: translateY(-1px);
           box-shadow: 0 10px 24px rgba(37, 99, 235, 0.45);
-        }}
+        }
 
         /* File uploader dropzone */
-        [data-testid="stFileUploaderDropzone"] {{
+        [data-testid="stFileUploaderDropzone"] {
           background: var(--card);
           border-radius: 12px;
           border: 1px dashed rgba(2, 6, 23, 0.18);
           box-shadow: inset 0 0 0 1px rgba(2, 6, 23, 0.04);
-        }}
+        }
 
-        textarea, .stTextArea textarea {{
+        textarea, .stTextArea textarea {
           border-radius: 12px !important;
           border: 1px solid rgba(2, 6, 23, 0.1);
           box-shadow: 0 4px 12px rgba(2, 6, 23, 0.05);
-        }}
+        }
 
         /* Code block */
-        pre, code {{
+        pre, code {
           border-radius: 12px !important;
-        }}
+        }
 
         /* Copy button inside components.html */
-        .copy-btn {{
+        .copy-btn {
           background: var(--card);
           color: var(--text);
           border: 1px solid rgba(2, 6, 23, 0.12);
@@ -169,65 +217,88 @@ def inject_css(theme: str) -> None:
           font-weight: 600;
           transition: background 0.2s ease, box-shadow 0.2s ease, transform 0.06s ease;
           box-shadow: 0 4px 12px rgba(2,6,23,0.06);
-        }}
-        .copy-btn:hover {{
+        }
+        .copy-btn:hover {
           transform: translateY(-1px);
           box-shadow: 0 8px 18px rgba(2,6,23,0.10);
-        }}
+        }
 
-        /* Section titles */
-        .cc-title {{
-          font-weight: 800; letter-spacing: -0.01em;
-        }}
+        .cc-label {
+          margin-top: 0.5rem;
+        }
         </style>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
+
+
+# Only two themes exist, so both critical blocks are built once at import.
+_CRITICAL_CSS_LIGHT = _build_critical_css("Light")
+_CRITICAL_CSS_DARK = _build_critical_css("Dark")
+
+
+def inject_critical_css(theme: str) -> None:
+    # Theme variables and app background; emitted before any content
+    st.markdown(_CRITICAL_CSS_DARK if theme == "Dark" else _CRITICAL_CSS_LIGHT, unsafe_allow_html=True)
+
+
+def inject_full_css() -> None:
+    st.markdown(_FULL_CSS, unsafe_allow_html=True)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _b64(code: str) -> str:
+    return base64.b64encode(code.encode("utf-8")).decode("ascii")
 
 
 def render_copy_button(code: str) -> None:
-    # Use components.html to trigger clipboard copy via JS
-    code_js = json.dumps(code)  # safely escape
+    # Use components.html to trigger clipboard copy via JS; st.markdown strips
+    # inline event handlers, so the button needs its own document.
+    # Base64 needs no escaping inside the attribute; decode back to UTF-8 client-side.
+    code_b64 = _b64(code)
     components.html(
         f"""
         <div style="display:flex;align-items:center;gap:0.5rem;">
-          <button class="copy-btn" onclick='navigator.clipboard.writeText({code_js}).then(() => {{ window.parent.postMessage({{"type":"copy-success"}}, "*"); }});'>📋 Copy Code</button>
+          <button class="copy-btn" onclick='navigator.clipboard.writeText(new TextDecoder().decode(Uint8Array.from(atob("{code_b64}"), (c) => c.charCodeAt(0))));'>📋 Copy Code</button>
         </div>
         """,
         height=50,
     )
 
 
-def main():
-    # Sidebar - settings and info
-    with st.sidebar:
-        st.subheader("Settings")
-        st.session_state.theme = st.selectbox("Theme", ["Light", "Dark"], index=(0 if st.session_state.theme == "Light" else 1))
-        st.session_state.history_limit = st.slider("History size", 3, 30, st.session_state.history_limit)
-        st.markdown("---")
-        st.subheader("About")
-        st.markdown("Built with Streamlit · by Your Name")
-        st.caption("This app simulates code conversion; connect to a backend to enable real translations.")
+@st.fragment
+def render_output() -> None:
+    # Own fragment so input-area interactions don't re-send the output block
+    st.markdown("---\n\n#### Output Code")
+    if st.session_state.output_code:
+        out_ext, out_lang, mime = language_to_ext_and_highlight(st.session_state.output_lang)
+        st.code(st.session_state.output_code, language=out_lang)
 
-    inject_css(st.session_state.theme)
+        # Actions row
+        ac1, ac2, ac3 = st.columns([0.18, 0.2, 0.62])
+        with ac1:
+            render_copy_button(st.session_state.output_code)
+        with ac2:
+            st.download_button(
+                label="⬇️ Download Code",
+                data=st.session_state.output_bytes,
+                file_name=f"converted{out_ext}",
+                mime=mime,
+                use_container_width=True,
+            )
+    else:
+        st.info("Your converted code will appear here after conversion.")
 
-    # Header row with title and Ask AI button on the right
-    title_col, ai_col = st.columns([0.8, 0.2])
-    with title_col:
-        st.markdown("## 💻 Code Converter")
-        st.caption("Convert code between languages with AI (placeholder)")
-    with ai_col:
-        if st.button("🧠 Ask AI", use_container_width=True):
-            st.session_state.ai_open = True
 
+@st.fragment
+def input_section() -> None:
+    # Interactions in here rerun only this fragment; a conversion reruns the app
     # Language selectors
     with st.container():
         st.markdown(" ")
         lang_col1, lang_col2 = st.columns(2)
         with lang_col1:
-            st.session_state.from_lang = st.selectbox("From Language", LANGUAGES, index=LANGUAGES.index(st.session_state.from_lang))
+            st.session_state.from_lang = st.selectbox("From Language", LANGUAGES, index=_LANG_INDEX[st.session_state.from_lang])
         with lang_col2:
-            st.session_state.to_lang = st.selectbox("To Language", LANGUAGES, index=LANGUAGES.index(st.session_state.to_lang))
+            st.session_state.to_lang = st.selectbox("To Language", LANGUAGES, index=_LANG_INDEX[st.session_state.to_lang])
 
     st.markdown("---")
 
@@ -250,13 +321,12 @@ def main():
                 accept_multiple_files=False,
                 help="Drag & drop or browse a single file",
             )
-            if uploaded is not None:
+            # The uploader returns the same file on every rerun; only load it once
+            if uploaded is not None and uploaded.file_id != st.session_state.get("_loaded_file_id"):
                 try:
                     content_bytes = uploaded.read()
-                    try:
-                        content = content_bytes.decode("utf-8")
-                    except UnicodeDecodeError:
-                        content = content_bytes.decode("latin-1", errors="replace")
+                    # Single pass; invalid bytes become U+FFFD instead of retrying as latin-1
+                    content = content_bytes.decode("utf-8", errors="replace")
 
                     if st.session_state.input_code.strip():
                         # Append to avoid overwriting user's manual input
@@ -267,9 +337,10 @@ def main():
                         st.success(f"Loaded '{uploaded.name}' into input code.")
                 except Exception as e:
                     st.error(f"Failed to read uploaded file: {e}")
+                finally:
+                    st.session_state._loaded_file_id = uploaded.file_id
 
-        st.markdown(" ")
-        st.markdown("Input Code")
+        st.markdown("<div class='cc-label'>Input Code</div>", unsafe_allow_html=True)
         st.text_area(
             label="Input Code",
             key="input_code",
@@ -300,31 +371,80 @@ def main():
                     code=st.session_state.input_code,
                 )
                 st.session_state.output_code = result
-            st.success(f"Conversion from {from_lang} to {to_lang} completed!")
+                st.session_state.output_bytes = result.encode("utf-8")
+                st.session_state.output_lang = to_lang
             add_to_history(from_lang, to_lang, st.session_state.prompt, st.session_state.input_code)
+            # Shown after the rerun that refreshes the output and history fragments
+            st.session_state._convert_notice = f"Conversion from {from_lang} to {to_lang} completed!"
+            st.rerun(scope="app")
 
-    st.markdown("---")
+    notice = st.session_state.pop("_convert_notice", None)
+    if notice:
+        st.success(notice)
 
-    # Output area and actions
-    out_ext, out_lang, mime = language_to_ext_and_highlight(st.session_state.to_lang)
-    st.markdown("#### Output Code")
-    if st.session_state.output_code:
-        st.code(st.session_state.output_code, language=out_lang)
 
-        # Actions row
-        ac1, ac2, ac3 = st.columns([0.18, 0.2, 0.62])
-        with ac1:
-            render_copy_button(st.session_state.output_code)
-        with ac2:
-            st.download_button(
-                label="⬇️ Download Code",
-                data=st.session_state.output_code.encode("utf-8"),
-                file_name=f"converted{out_ext}",
-                mime=mime,
-                use_container_width=True,
+@st.fragment
+def history_section() -> None:
+    with st.expander("History", expanded=False):
+        # Expander bodies always execute; only render entries once asked to
+        if not st.toggle("Show entries", key="history_open"):
+            st.caption(f"{len(st.session_state.history)} conversion(s) recorded.")
+        elif st.session_state.history:
+            # One markdown element for all entries instead of two per entry;
+            # user text is escaped so one entry cannot spill into the next
+            st.markdown(
+                "".join(
+                    f"**{item['from']} → {item['to']}** · {item['time']}  \n"
+                    f"Prompt: {_md_escape(item['prompt']) or '—'}  \n"
+                    f"Snippet: {_md_code_span(item['code_preview']) if item['code_preview'] else '—'}\n\n---\n\n"
+                    for item in st.session_state.history
+                )
             )
-    else:
-        st.info("Your converted code will appear here after conversion.")
+            if st.button("Clear History"):
+                st.session_state.history.clear()
+                st.info("History cleared.")
+        else:
+            st.write("No conversions yet.")
+
+
+def main():
+    # Sidebar - settings and info
+    with st.sidebar:
+        st.subheader("Settings")
+        st.session_state.theme = st.selectbox("Theme", ["Light", "Dark"], index=(0 if st.session_state.theme == "Light" else 1))
+        st.session_state.history_limit = st.slider("History size", 3, 30, st.session_state.history_limit)
+        if st.session_state.history.maxlen != st.session_state.history_limit:
+            # Keep the newest entries when resizing
+            limit = st.session_state.history_limit
+            st.session_state.history = deque(islice(st.session_state.history, limit), maxlen=limit)
+        st.markdown("---")
+        st.subheader("About")
+        st.markdown("Built with Streamlit · by Your Name")
+        st.caption("This app simulates code conversion; connect to a backend to enable real translations.")
+
+    inject_critical_css(st.session_state.theme)
+
+    # Header row with title and Ask AI button on the right
+    title_col, ai_col = st.columns([0.8, 0.2])
+    with title_col:
+        st.markdown(
+            "<h2 class='cc-title'>💻 Code Converter</h2>"
+            "<p class='cc-caption'>Convert code between languages with AI (placeholder)</p>",
+            unsafe_allow_html=True,
+        )
+    with ai_col:
+        if st.button("🧠 Ask AI", use_container_width=True):
+            st.session_state.ai_open = True
+
+    # Remaining component styles once the header is on the page
+    inject_full_css()
+
+    # Input, output and history are fragments: their widgets only rerun
+    # their own region
+    input_section()
+
+    # Output area and actions
+    render_output()
 
     # Ask AI expander (chat-like area)
     with st.expander("🧠 Ask AI", expanded=st.session_state.ai_open):
@@ -350,36 +470,7 @@ def main():
                 st.experimental_rerun()
 
     # History section at the bottom
-    with st.expander("History", expanded=False):
-        if st.session_state.history:
-            for item in st.session_state.history:
-                st.markdown(
-                    f"**{item['from']} → {item['to']}** · {item['time']}  \n"
-                    f"Prompt: {item['prompt'] or '—'}  \n"
-                    f"Snippet: {item['code_preview'] or '—'}"
-                )
-                st.markdown("---")
-            if st.button("Clear History"):
-                st.session_state.history = []
-                st.info("History cleared.")
-        else:
-            st.write("No conversions yet.")
-
-
-# Listen to copy success message from iframe and show a toast
-components.html(
-    """
-    <script>
-      window.addEventListener('message', (event) => {
-        if (event.data && event.data.type === 'copy-success') {
-          const streamlitMsg = {isStreamlitMessage: true, type: 'streamlit:setComponentValue', value: 'copied'};
-          window.parent.postMessage(streamlitMsg, '*');
-        }
-      });
-    </script>
-    """,
-    height=0,
-)
+    history_section()
 
 
 if __name__ == "__main__":